@@ -0,0 +1,19 @@
+"""Compile the numba kernels in kernels.py ahead of time to the loan_kernels extension module
+
+loan_amort.py imports loan_kernels when it exists, which avoids the JIT compilation at import.
+Run from the repository root: python build_aot.py
+"""
+
+import os
+from numba.pycc import CC
+import kernels
+
+cc = CC('loan_kernels')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# 13 float64 arrays followed by 5 float64 scalars, see kernels.recur
+cc.export('recur', 'void(' + ', '.join(['f8[:]'] * 13 + ['f8'] * 5) + ')')(kernels.recur.py_func)
+cc.export('npv', 'f8(f8[:], f8)')(kernels.npv.py_func)
+
+if __name__ == '__main__':
+    cc.compile()
@@ -1,9 +1,14 @@
-"""parse YAML config file and read charged off table and prepay table from input
+"""parse YAML config file and read charged off table and prepay table from input on first use
 """
 
+import hashlib
+from functools import lru_cache
+from typing import Dict, Tuple
+import numpy as np
 import pandas as pd
 import yaml
 import os
+import tempfile
 
 curr_dir = os.path.dirname(__file__)
 config_file = os.path.join(curr_dir, 'config.yaml')
@@ -17,10 +22,105 @@ with open(config_file, 'r') as f:
     charge_off_sheet_name = input['default_sheetname']
     prepay_sheet_name = input['prepay_sheetname']
 
-# read charged off and prepay tables to pandas DataFrames
-CHARGED_OFF = pd.read_excel(filename, sheet_name=charge_off_sheet_name)
-PREPAY = pd.read_excel(filename, sheet_name=prepay_sheet_name)
-# remove empty columns
-PREPAY.drop(list(PREPAY.filter(regex='Unnamed')), axis=1, inplace=True)
-# drop first row: 12M, 18M, 24M ...
-PREPAY = PREPAY.iloc[1:, :]
+cache_dir = os.path.join(curr_dir, '.cache')
+
+
+def read_sheet(filename: str, sheet_name: str) -> pd.DataFrame:
+    """Read an Excel sheet, cached as a pickle keyed by the file content hash
+
+    Args:
+        filename (str): Excel file full path
+        sheet_name (str): sheet name
+
+    Returns:
+        pd.DataFrame: sheet content
+    """
+    with open(filename, 'rb') as f:
+        digest = hashlib.blake2b(f.read()).hexdigest()[:16]
+    cache_file = os.path.join(cache_dir, f'{digest}-{sheet_name}.pkl')
+    if os.path.exists(cache_file):
+        try:
+            return pd.read_pickle(cache_file)
+        except Exception:
+            # corrupted or unreadable (e.g. other pandas version) cache, parse the sheet again
+            pass
+    df = pd.read_excel(filename, sheet_name=sheet_name, engine='calamine')
+    # caching is best effort (e.g. read-only install), write to a temp file and move it into place
+    # so that an interrupted or concurrent write never leaves a truncated pickle behind
+    tmp_file = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        df.to_pickle(tmp_file)
+        os.replace(tmp_file, cache_file)
+    except OSError:
+        if tmp_file is not None and os.path.exists(tmp_file):
+            os.remove(tmp_file)
+    return df
+
+
+def _read_only(arr: np.ndarray) -> np.ndarray:
+    # cached lookups are shared by all loans, callers have to copy before modifying
+    arr = arr.copy()
+    arr.setflags(write=False)
+    return arr
+
+
+# the tables are read on first use rather than at import, see the get_* accessors below
+@lru_cache(maxsize=None)
+def get_charged_off() -> pd.DataFrame:
+    """Charge Off table as a pandas DataFrame
+    """
+    return read_sheet(filename, charge_off_sheet_name)
+
+
+@lru_cache(maxsize=None)
+def get_prepay() -> pd.DataFrame:
+    """Prepay table as a pandas DataFrame, columns are the numbers of payment periods
+    """
+    prepay = read_sheet(filename, prepay_sheet_name)
+    # remove empty columns
+    prepay = prepay.drop(list(prepay.filter(regex='Unnamed')), axis=1)
+    # drop first row: 12M, 18M, 24M ...
+    return prepay.iloc[1:, :]
+
+
+@lru_cache(maxsize=None)
+def get_prepay_arrays() -> Dict[int, np.ndarray]:
+    """NaN-stripped float64 prepay speeds by number of payment periods
+    """
+    prepay = get_prepay()
+    return {col: _read_only(prepay[col].dropna().to_numpy(dtype=np.float64)) for col in prepay.columns}
+
+
+@lru_cache(maxsize=None)
+def get_charged_off_arrays() -> Dict[str, np.ndarray]:
+    """float64 charge off rates by column name, non-numeric cells (e.g. 'x' padding) become NaN
+    """
+    charged_off = get_charged_off()
+    return {col: _read_only(pd.to_numeric(charged_off[col], errors='coerce').to_numpy(dtype=np.float64))
+            for col in charged_off.columns}
+
+
+@lru_cache(maxsize=None)
+def get_charged_off_cols() -> Tuple[str, ...]:
+    """Charge Off table column names, for lookups by column number
+    """
+    return tuple(get_charged_off().columns)
+
+
+_LAZY_TABLES = {
+    'CHARGED_OFF': get_charged_off,
+    'PREPAY': get_prepay,
+    'PREPAY_ARR': get_prepay_arrays,
+    'CHARGED_OFF_ARR': get_charged_off_arrays,
+    'CHARGED_OFF_COLS': get_charged_off_cols,
+}
+
+
+def __getattr__(name: str):
+    # keep the module level table names working, loaded on first access
+    if name in _LAZY_TABLES:
+        return _LAZY_TABLES[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
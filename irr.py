@@ -1,15 +1,131 @@
 import scipy.optimize as opt
 import numpy as np
 from numpy.typing import ArrayLike
+from typing import Optional
 import logging
 
+try:
+    # ahead of time compiled kernels, see build_aot.py
+    from loan_kernels import npv as _npv
+except ImportError:
+    from kernels import npv as _npv
+
+try:
+    from scipy.optimize._chandrupatla import _chandrupatla
+except ImportError:
+    # private scipy API, irr_batch solves row by row when it isn't available
+    _chandrupatla = None
+
+# candidate rates scanned for a sign change of NPV before falling back to broyden1
+BRACKET_RATES = np.array([-0.99, -0.5, 0.0, 1.0, 10.0])
+
+
+def _sign_changes(cashflows: np.ndarray)->np.ndarray:
+    """Number of sign changes in each row of a 2D cash flow array, zeros are skipped
+    """
+    n = cashflows.shape[1]
+    signs = np.sign(cashflows)
+    # carry the previous nonzero sign forward over zeros
+    last_nonzero = np.maximum.accumulate(np.where(signs != 0, np.arange(n), 0), axis=1)
+    signs = np.take_along_axis(signs, last_nonzero, axis=1)
+    return (signs[:, 1:] * signs[:, :-1] < 0).sum(axis=1)
+
+
+def _bracket_solve(npv, guess: float)->Optional[float]:
+    """Solve npv(r) = 0 by Brent's method on the interval of BRACKET_RATES closest to guess where
+    npv changes sign, or return a rate of BRACKET_RATES where npv is 0. Returns None when none of the
+    intervals brackets a root.
+    """
+    values = np.array([npv(r) for r in BRACKET_RATES])
+    roots = BRACKET_RATES[values == 0]
+    if roots.size:
+        # a candidate rate is itself a root
+        return roots[np.argmin(np.abs(roots - guess))]
+    brackets = np.flatnonzero(values[:-1] * values[1:] < 0)
+    if brackets.size:
+        # sign changing interval closest to guess
+        lo, hi = BRACKET_RATES[brackets], BRACKET_RATES[brackets + 1]
+        i = np.argmin(np.maximum(lo - guess, 0) + np.maximum(guess - hi, 0))
+        return opt.brentq(npv, lo[i], hi[i], xtol=1e-10)
+    return None
+
+
 def irr(cashflow: ArrayLike, guess: float = 0.0)->float:
+    """Internal rate of return of a cash flow series.
+
+    By Descartes' rule of signs, a series whose signs change exactly once has a single IRR, which is
+    solved by Brent's method on an interval of BRACKET_RATES where NPV changes sign.
+    Otherwise NPV(r) = sum(cashflow[t] * x**t) with x = 1/(1+r) is a polynomial in x, so the IRR is taken
+    from its real positive roots (numpy.roots, an O(N^3) eigenvalue solve). When several rates exist, the
+    one nearest to guess is returned. When no real positive root is found, the bracketed Brent's method
+    is tried again, or Broyden's method if no interval brackets a root.
+
+    Args:
+        cashflow (ArrayLike): cash flows, cashflow[0] is the cash flow at time 0
+        guess (float): initial guess of the rate. Default to 0.0
+
+    Returns:
+        float: internal rate of return per period
+    """
+    cashflow = np.ascontiguousarray(cashflow, dtype=np.float64)
     def npv(r: float)->float:
-        periods = np.arange(len(cashflow))
-        return sum(cashflow / (1+r)**periods)
+        return _npv(cashflow, float(r))
+
+    if _sign_changes(cashflow[None, :])[0] == 1:
+        r = _bracket_solve(npv, guess)
+        if r is not None:
+            return r
+
+    # np.roots expects the coefficient of the highest power first
+    roots = np.roots(cashflow[::-1])
+    mask = np.isreal(roots) & (roots.real > 0)
+    if mask.any():
+        rates = 1.0 / roots.real[mask] - 1.0
+        return rates[np.argmin(np.abs(rates - guess))]
+
+    # numerically the roots may carry tiny imaginary parts, so fall back to a solver on NPV
+    r = _bracket_solve(npv, guess)
+    if r is not None:
+        return r
     try:
         r = opt.broyden1(npv, guess, f_tol=1e-10)
-    except opt.nonlin.NoConvergence as e:
+    except opt.NoConvergence as e:
         r = e.args[0]
         logging.warning("IRR solver doesn't converge!")
-    return r
\ No newline at end of file
+    return r
+
+
+def irr_batch(cashflows: ArrayLike, guess: float = 0.0)->np.ndarray:
+    """Internal rates of return of many cash flow series at once, the same rates as irr() row by row.
+
+    By Descartes' rule of signs, a series whose signs change exactly once has a single IRR. Those rows
+    are solved together by a vectorized Chandrupatla iteration bracketed on [-0.99, 10]. Rows which may
+    have several IRRs or none, and rows whose IRR isn't in the bracket, are solved by irr() one at a time.
+
+    Args:
+        cashflows (ArrayLike): (M, N) cash flows, one series per row. Shorter series can be zero padded
+        guess (float): initial guess of the rate passed to irr() for the row by row solves. Default to 0.0
+
+    Returns:
+        np.ndarray: (M,) internal rates of return per period
+    """
+    cfs = np.atleast_2d(np.asarray(cashflows, dtype=np.float64))
+    m, n = cfs.shape
+    rates = np.full(m, np.nan)
+    single = _sign_changes(cfs) == 1
+
+    if _chandrupatla is not None and single.any():
+        rows = np.flatnonzero(single)
+        periods = np.arange(n)
+        def npv(r: np.ndarray, rows: np.ndarray)->np.ndarray:
+            # the solver only passes the rows which haven't converged yet
+            # near r = -0.99 long series overflow to +-inf, which still gives the sign at the bracket end
+            with np.errstate(divide='ignore', over='ignore', invalid='ignore'):
+                return (cfs[rows] / (1 + r[:, None])**periods).sum(axis=1)
+        res = _chandrupatla(npv, np.full(rows.size, -0.99), np.full(rows.size, 10.0), args=(rows,))
+        converged = res.status == 0
+        rates[rows[converged]] = res.x[converged]
+        single[rows[~converged]] = False
+    for i in np.flatnonzero(~single):
+        rates[i] = irr(cfs[i], guess)
+    return rates
@@ -0,0 +1,55 @@
+"""Numerical kernels of the cash flow and IRR calculations
+
+The kernels are jit compiled by numba when it's installed and run as plain Python functions otherwise.
+build_aot.py compiles them ahead of time to the loan_kernels extension module, which is preferred when present.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    # numba is optional, kernels run as plain Python functions without it
+    def njit(*args, **kwargs):
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+
+@njit(cache=True, fastmath=True)
+def recur(balance, default, prepay, principle, interest, recovery, servicing_cf, total_cf,
+          default_rate, prepay_speed, earout_cf, scheduled_interest, principal_ratio,
+          def_mul, pre_mul, rate, recov_rate, fee):
+    """Default and prepay adjusted recurrence, see loan_amort.Amortization.calc_default_prepay_adjust_cashflow.
+    Recovery, servicing and total cash flows are computed in the same pass.
+    principal_ratio[i] = scheduled_principal[i] / scheduled_balance[i - 1] is precomputed so the loop only multiplies.
+    balance[0] and total_cf[0] have to be set by the caller, the other arrays are filled in place.
+    """
+    for i in range(1, len(balance)):
+        default[i] = balance[i-1] * default_rate[i-1] * def_mul
+        prepay[i] = (balance[i-1] - (balance[i-1] - scheduled_interest[i]) * principal_ratio[i]) \
+                    * prepay_speed[i] * pre_mul
+        principle[i] = (balance[i-1] - default[i]) * principal_ratio[i] + prepay[i]
+        balance[i] = balance[i-1] - principle[i] - default[i]
+        interest[i] = (balance[i-1] - default[i]) * rate
+        recovery[i] = default[i] * recov_rate
+        servicing_cf[i] = (balance[i-1] - default[i]) * fee
+        total_cf[i] = principle[i] + interest[i] + recovery[i] - servicing_cf[i] - earout_cf[i]
+
+
+@njit(cache=True)
+def npv(cashflow, r):
+    """Net present value of cashflow at the rate r per period, see irr.irr.
+    The discount factors 1/(1+r)^t are built by a running product instead of a power per period.
+    """
+    if r == -1.0:
+        # 1/(1+r) is unbounded, follow NumPy's float division instead of raising ZeroDivisionError
+        d = np.inf
+    else:
+        d = 1.0 / (1.0 + r)
+    acc = 0.0
+    v = 1.0
+    for i in range(len(cashflow)):
+        acc += cashflow[i] * v
+        v *= d
+    return acc
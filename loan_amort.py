@@ -1,15 +1,30 @@
 from dataclasses import dataclass
-from input import CHARGED_OFF, PREPAY
+from datetime import datetime
+from input import get_charged_off_arrays, get_charged_off_cols, get_prepay_arrays
 import numpy as np
-import numpy_financial as npf
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
 from pandas._libs.tslibs.timestamps import Timestamp
 from typing import Union, Optional
 
-__all__ = ['Loan', 'Amortization', 'FREQ_PERIOD_MAP']
+try:
+    # ahead of time compiled kernels, see build_aot.py
+    from loan_kernels import recur as _recur
+except ImportError:
+    from kernels import recur as _recur
+    # compile once at import so that the first loan doesn't pay the JIT cost
+    _warmup = np.ones(2, dtype=np.float64)
+    _recur(*(_warmup.copy() for _ in range(8)), _warmup, _warmup, _warmup, _warmup, _warmup,
+           1.0, 1.0, 0.0, 0.0, 0.0)
+    del _warmup
+
+__all__ = ['Loan', 'Amortization', 'FREQ_PERIOD_MAP', 'FREQ_OFFSET_MAP']
 
 FREQ_PERIOD_MAP = {'D': 365, 'M': 12, '3M': 4, '6M': 2,
                    'Y': 1}  # actual / 365 day count convention
+# pandas offset aliases of the amortization frequencies, 'M' and 'Y' are deprecated since pandas 2.2
+FREQ_OFFSET_MAP = {'D': 'D', 'M': 'ME', '3M': '3ME', '6M': '6ME', 'Y': 'YE'}
 
 
 class Loan:
@@ -17,7 +32,7 @@ class Loan:
     def __init__(
             self,
             grade: str,
-            issue_date: str,
+            issue_date: Union[str, datetime, Timestamp],
             term: int,
             coupon: float,
             invested: float,
@@ -44,7 +59,7 @@ class Loan:
             - charge_off_col_num (int): column number in the charge off table, used to look up for the charge off rates
         """
         self.grade = str(grade)
-        self.issue_date = pd.to_datetime(issue_date)
+        self.issue_date = issue_date if isinstance(issue_date, Timestamp) else Timestamp(issue_date)
         self.term = term
         self.coupon = coupon
         self.invested = invested
@@ -54,7 +69,7 @@ class Loan:
         self.servicing_fee = serv_fee
         self.earnout_fee = earnout_fee
         self.amort_freq = amort_freq
-        self.charge_off_lookup_key = '-'.join([str(term), self.grade])
+        self.charge_off_lookup_key = f'{term}-{self.grade}'
         self.charge_off_col_num = charge_off_col_num
 
 
@@ -81,6 +96,14 @@ class Amortization:
     _default_multiplier: float = 1.0
     _prepay_multiplier: float = 1.0
 
+    # float columns of the cash flow table and the attributes holding them
+    FIELDS = (('Scheduled_Principal', 'scheduled_principal'), ('Scheduled_Interest', 'scheduled_interest'),
+              ('Scheduled_Balance', 'scheduled_balance'), ('Prepay_Speed', 'prepay_speed'),
+              ('Default_Rate', 'default_rate'), ('Recovery', 'recovery'), ('Servicing_CF', 'servicing_cf'),
+              ('Earnout_CF', 'earout_cf'), ('Balance', 'balance'), ('Principal', 'principle'),
+              ('Default', 'default'), ('Prepay', 'prepay'), ('Interest_Amount', 'interest'),
+              ('Total_CF', 'total_cf'))
+
     @property
     def default_multiplier(self):
         return self._default_multiplier
@@ -108,68 +131,78 @@ class Amortization:
         # add 1 to nper to include issue_date
         nper = periods + 1
         self.pmt_date = pd.date_range(
-            start=start_date, periods=nper, freq=freq)
+            start=start_date, periods=nper, freq=FREQ_OFFSET_MAP.get(freq, freq))
         # pd.date_range will generate end of month dates, update day if start_date isn't an end of month date
         if start_date.day != self.pmt_date[0].day:
-            self.pmt_date = list(map(lambda t: t.replace(day = start_date.day), self.pmt_date))
-        
+            # move back to start_date's day, capped at the month end for shorter months
+            days_back = self.pmt_date.day - np.minimum(self.pmt_date.day, start_date.day)
+            self.pmt_date = self.pmt_date - pd.to_timedelta(days_back, unit='D')
 
     def fetch_prepay_speed(self, nper: int):
-        """Retrieve prepay speed from PREPAY DataFrame by number of payment periods
+        """Retrieve prepay speed from the Prepay table lookup (input.get_prepay_arrays) by number of payment periods
 
         Args:
             nper (int): number of payment periods
         """
-        if nper not in PREPAY:
+        prepay = get_prepay_arrays()
+        if nper not in prepay:
             raise KeyError(
                 f'{nper} cannot be found in the Prepay table')
         self.prepay_speed = np.zeros(nper + 1)
-        #TODO: check PREPAY[nper].dropna() length
-        self.prepay_speed[1:] = PREPAY[nper].dropna().to_numpy()
+        #TODO: check get_prepay_arrays()[nper] length
+        self.prepay_speed[1:] = prepay[nper]
 
     def fetch_default_rate(self, chargeoff_col: Union[str, int]):
-        """Retrieve default rate from CHARGED_OFF DataFrame by chargeoff_col_name
+        """Retrieve default rate from the Charge Off table lookup (input.get_charged_off_arrays) by column name or number
 
         Args:
-            chargeoff_col (str): column name in the CHARGED_OFF DataFrame
+            chargeoff_col (str or int): column name or column number in the Charge Off table
 
         Returns:
             np.ndarray: default rate
         """
+        charged_off = get_charged_off_arrays()
         if isinstance(chargeoff_col, int):
-            if chargeoff_col >= CHARGED_OFF.shape[1]:
+            charged_off_cols = get_charged_off_cols()
+            if chargeoff_col >= len(charged_off_cols):
                 raise ValueError(
                     f"{chargeoff_col} exceeds Charge Off table's column index.")
-            self.default_rate = CHARGED_OFF.iloc[:, chargeoff_col].to_numpy()
+            self.default_rate = charged_off[charged_off_cols[chargeoff_col]].copy()
         elif isinstance(chargeoff_col, str):
-            if chargeoff_col not in CHARGED_OFF:
+            if chargeoff_col not in charged_off:
                 raise KeyError(
                     f'{chargeoff_col} cannot be found in the Charge Off table')
-            self.default_rate = CHARGED_OFF[chargeoff_col].to_numpy()
+            self.default_rate = charged_off[chargeoff_col].copy()
         else:
             raise KeyError(f"chargeoff_col argument must be either a str or an int")
 
-    def calc_scheduled_cashflow(self, loan: Loan):
+    def calc_scheduled_cashflow(self, loan: Loan, rate: Optional[float] = None):
         """Calculate a loan's scheduled principal, scheduled interest and scheduled balance
 
         Args:
             loan (Loan): Loan object of a loan's characteristics
+            rate (float): coupon rate per period. Default to loan.coupon / FREQ_PERIOD_MAP[loan.amort_freq]
         """
-        rate = loan.coupon / FREQ_PERIOD_MAP[loan.amort_freq]
+        if rate is None:
+            rate = loan.coupon / FREQ_PERIOD_MAP[loan.amort_freq]
         nper = loan.term
         pv = -loan.invested
         nper_1 = nper + 1
         self.pmt_cnt = np.arange(0, nper_1)
+        # level payment: pmt = rate * pv / (1 - (1 + rate)^-nper), ppmt[n] = pmt * (1 + rate)^(n - nper - 1)
+        if rate == 0:
+            pmt = -pv / nper
+        else:
+            pmt = -pv * rate / (1 - (1 + rate) ** -nper)
         self.scheduled_principal = np.zeros(nper_1)
-        self.scheduled_principal[1:] = npf.ppmt(rate, self.pmt_cnt[1:], nper, pv)
+        self.scheduled_principal[1:] = pmt * (1 + rate) ** (self.pmt_cnt[1:] - nper - 1)
         self.scheduled_interest = np.zeros(nper_1)
-        self.scheduled_interest[1:] = npf.ipmt(rate, self.pmt_cnt[1:], nper, pv)
-        self.scheduled_balance = np.zeros(nper_1)
-        self.scheduled_balance[0] = loan.invested
-        for i in range(1, nper_1):
-            self.scheduled_balance[i] = self.scheduled_balance[i - 1] - self.scheduled_principal[i]
+        self.scheduled_interest[1:] = pmt - self.scheduled_principal[1:]
+        # scheduled_principal[0] is 0, so the running sum starts from the invested amount
+        self.scheduled_balance = loan.invested - np.cumsum(self.scheduled_principal)
 
-    def calc_default_prepay_adjust_cashflow(self, loan: Loan):
+    def calc_default_prepay_adjust_cashflow(self, loan: Loan, rate: Optional[float] = None,
+                                            nper_per_year: Optional[int] = None):
         """calculate prepay, default, balance, principal and interest after default and prepay adjustment
             - default[i] = balance[i - 1] * default rate[i - 1] * default_multiplier
             - prepay[i] = (balance[i - 1] - (balance[i - 1] - scheduled_interest[i])/scheduled_balance[i - 1] * scheduled_principal[i])
@@ -179,38 +212,40 @@ class Amortization:
             - interest[i] = (balance[i - 1] - default[i]) * rate
         Args:
             loan (Loan): Loan object of a loan's characteristics
+            rate (float): coupon rate per period. Default to loan.coupon / nper_per_year
+            nper_per_year (int): number of payment periods per year. Default to FREQ_PERIOD_MAP[loan.amort_freq]
         """
         if self.pmt_cnt is None:
             raise("calc_scheduled_cashflow needs to be called first")
         nper = len(self.pmt_cnt)
-        # preallocate
+        # preallocate, fresh arrays on every call so results of earlier runs are kept intact
         self.balance = np.zeros(nper)
         self.default = np.zeros(nper)
         self.prepay = np.zeros(nper)
         self.principle = np.zeros(nper)
         self.interest = np.zeros(nper)
-        nper_per_year = FREQ_PERIOD_MAP[loan.amort_freq]
-        rate = loan.coupon / nper_per_year
-        # intial cashflow
-        self.balance[0] = self.scheduled_balance[0]
-        # loop through all periods
-        for i in range(1, nper):
-            self.default[i] = self.balance[i-1] * self.default_rate[i-1] * self._default_multiplier
-            self.prepay[i] = (self.balance[i-1] - (self.balance[i-1] - self.scheduled_interest[i]) / self.scheduled_balance[i-1]
-                              * self.scheduled_principal[i]) * self.prepay_speed[i] * self._prepay_multiplier
-            self.principle[i] = (self.balance[i-1] - self.default[i]) * self.scheduled_principal[i] / self.scheduled_balance[i-1] \
-                              + self.prepay[i]
-            self.balance[i] = self.balance[i-1] - self.principle[i] - self.default[i]
-            self.interest[i] = (self.balance[i-1] - self.default[i]) * rate
-
-        self.recovery = self.default * loan.recovery_rate
+        self.recovery = np.zeros(nper)
         self.servicing_cf = np.zeros(nper)
-        self.servicing_cf[1:] = (
-            self.balance[0:-1] - self.default[1:]) * loan.servicing_fee / nper_per_year
         self.earout_cf = np.zeros(nper)
-        self.earout_cf[12] = self.earout_cf[18] = loan.earnout_fee / 2 * loan.invested
-        self.total_cf = self.principle + self.interest + self.recovery - self.servicing_cf - self.earout_cf
+        self.total_cf = np.zeros(nper)
+        if nper_per_year is None:
+            nper_per_year = FREQ_PERIOD_MAP[loan.amort_freq]
+        if rate is None:
+            rate = loan.coupon / nper_per_year
+        # intial cashflow
+        self.balance[0] = self.scheduled_balance[0]
         self.total_cf[0] = -loan.invested * (1 + loan.premium)
+        self.earout_cf[12] = self.earout_cf[18] = loan.earnout_fee / 2 * loan.invested
+        # scheduled_principal[i] / scheduled_balance[i - 1], one vectorized division instead of two per period
+        principal_ratio = np.zeros(nper, dtype=np.float64)
+        principal_ratio[1:] = self.scheduled_principal[1:] * (1.0 / self.scheduled_balance[:-1])
+        # loop through all periods
+        _recur(self.balance, self.default, self.prepay, self.principle, self.interest,
+               self.recovery, self.servicing_cf, self.total_cf,
+               self.default_rate, self.prepay_speed, self.earout_cf,
+               self.scheduled_interest, principal_ratio,
+               float(self._default_multiplier), float(self._prepay_multiplier), float(rate),
+               float(loan.recovery_rate), float(loan.servicing_fee / nper_per_year))
 
     def calc_cashflows(self, loan: Loan):
         """Calculate all cash flows for a loan
@@ -228,35 +263,27 @@ class Amortization:
             self.fetch_default_rate(loan.charge_off_lookup_key)
         # step 3 calculate payment dates
         self.payment_date(loan.issue_date, loan.term, loan.amort_freq)
+        nper_per_year = FREQ_PERIOD_MAP[loan.amort_freq]
+        rate = loan.coupon / nper_per_year
         # step 4 calculate scheduled cash flows
-        self.calc_scheduled_cashflow(loan)
+        self.calc_scheduled_cashflow(loan, rate=rate)
         # step 5 calculate prepay and default adjusted cash flows
-        self.calc_default_prepay_adjust_cashflow(loan)
+        self.calc_default_prepay_adjust_cashflow(loan, rate=rate, nper_per_year=nper_per_year)
 
         return self.to_dataframe()
 
     def to_dataframe(self):
-        months = range(1, len(self.pmt_date) + 1)
-        field_dict = {
-            'Months': months,
-            'Paymnt_Count': self.pmt_cnt,
-            'Payment_Date': self.pmt_date,
-            'Scheduled_Principal': self.scheduled_principal,
-            'Scheduled_Interest': self.scheduled_interest,
-            'Scheduled_Balance': self.scheduled_balance,
-            'Prepay_Speed': self.prepay_speed,
-            'Default_Rate': self.default_rate[:len(months)],
-            'Recovery': self.recovery,
-            'Servicing_CF': self.servicing_cf,
-            'Earnout_CF': self.earout_cf,
-            'Balance': self.balance,
-            'Principal': self.principle,
-            'Default': self.default,
-            'Prepay': self.prepay,
-            'Interest_Amount': self.interest,
-            'Total_CF': self.total_cf
-        }
-        return pd.DataFrame(field_dict)
+        """Cash flow table as a pandas DataFrame, built from the current attributes
+        """
+        # default_rate is a whole Charge Off column, only the first nper rates belong to the table
+        nper = len(self.pmt_cnt)
+        block = np.stack([np.asarray(getattr(self, attr), dtype=np.float64)[:nper] for _, attr in self.FIELDS])
+        # block is a fresh array, so the float columns wrap it without another copy
+        df = pd.DataFrame(block.T, columns=[col for col, _ in self.FIELDS], copy=False)
+        df.insert(0, 'Months', self.pmt_cnt + 1)
+        df.insert(1, 'Paymnt_Count', self.pmt_cnt)
+        df.insert(2, 'Payment_Date', self.pmt_date)
+        return df
 
     def __repr__(self):
         """ represent the class as a pandas DataFrame
@@ -269,4 +296,9 @@ class Amortization:
         Args:
             filename (str): output file full path
         """
-        self.to_dataframe().to_csv(filename, index=False)
\ No newline at end of file
+        table = pa.Table.from_pandas(self.to_dataframe(), preserve_index=False)
+        # write payment dates without the time of day, unless the issue date has one
+        if (self.pmt_date == self.pmt_date.normalize()).all():
+            i = table.schema.get_field_index('Payment_Date')
+            table = table.set_column(i, 'Payment_Date', table.column(i).cast(pa.date32()))
+        pa_csv.write_csv(table, filename)
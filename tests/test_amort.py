@@ -16,4 +16,43 @@ class TestAmortization:
         # exlude 'Payment_Date' and 'Playdate'
         arr_calc = cf_df.loc[:, cf_df.columns!='Payment_Date'].to_numpy()
         arr_ref = ref_df.loc[:, ref_df.columns!='Playdate'].to_numpy()
-        assert_almost_equal(arr_calc, arr_ref, decimal=6)
\ No newline at end of file
+        assert_almost_equal(arr_calc, arr_ref, decimal=6)
+
+    def test_default_rate_not_shared(self):
+        # stress adjusting one loan's default rate mustn't change the lookup table for other loans
+        cf = Amortization()
+        cf.fetch_default_rate('36-C4')
+        ref = cf.default_rate.copy()
+        cf.default_rate *= 1.5
+        other = Amortization()
+        other.fetch_default_rate('36-C4')
+        assert_almost_equal(other.default_rate, ref)
+
+    def test_scheduled_cashflow_without_lookups(self):
+        loan = Loan(grade = 'C4', issue_date = '08/24/2015', term = 36, coupon = 0.28, \
+                    invested=7500.0, outstanding_bal = 3228.61, recov_rate = 0.08, \
+                    premium = 0.0514, serv_fee = 0.025, earnout_fee = 0.025)
+        ref_df = pd.read_csv('./tests/results.csv', header=0)
+        cf = Amortization()
+        cf.calc_scheduled_cashflow(loan)
+        assert_almost_equal(cf.scheduled_balance, ref_df['Scheduled_Balance'].to_numpy(), decimal=6)
+        # lookups fetched after scheduling show up in the table
+        cf.calc_cashflows(loan)
+        cf.fetch_default_rate('36-C3')
+        cf.prepay_speed = cf.prepay_speed * 2
+        cf_df = cf.to_dataframe()
+        assert_almost_equal(cf_df['Default_Rate'].to_numpy(), cf.default_rate[:len(cf_df)])
+        assert_almost_equal(cf_df['Prepay_Speed'].to_numpy(), ref_df['Prepay_Speed'].to_numpy() * 2, decimal=6)
+
+    def test_stress_rerun_keeps_earlier_results(self):
+        loan = Loan(grade = 'C4', issue_date = '08/24/2015', term = 36, coupon = 0.28, \
+                    invested=7500.0, outstanding_bal = 3228.61, recov_rate = 0.08, \
+                    premium = 0.0514, serv_fee = 0.025, earnout_fee = 0.025)
+        cf = Amortization()
+        cf.calc_cashflows(loan)
+        base = cf.total_cf
+        ref = base.copy()
+        cf.default_multiplier = 1.5
+        cf.calc_default_prepay_adjust_cashflow(loan)
+        assert_almost_equal(base, ref)
+        assert cf.total_cf is not base
@@ -1,6 +1,10 @@
-from irr import irr
+import irr as irr_module
+from irr import irr, irr_batch
 from loan_amort import Loan, Amortization
 from numpy.testing import assert_almost_equal
+import logging
+import warnings
+import numpy as np
 
 class TestIRR:
     def test_irr(self):
@@ -22,4 +26,59 @@ class TestIRR:
         cf = Amortization()
         cf.calc_cashflows(loan)
         anual_irr = irr(cf.total_cf) * 12
-        assert_almost_equal(anual_irr, 0.0549130698297251)
\ No newline at end of file
+        assert_almost_equal(anual_irr, 0.0549130698297251)
+
+    def test_irr_batch(self):
+        v = [[-150000, 15000, 25000, 35000, 45000, 60000],
+             [-100, 0, 0, 74, 0, 0],
+             [-100, 39, 59, 55, 20, 0],
+             [-100, 100, 0, 7, 0, 0],
+             [0, -100, 0, 110, 0, 0],
+             # several sign changes, solved by irr() for the same root
+             [-100, 100, 0, -7, 0, 0],
+             [-5, 10.5, 1, -8, 1, 0],
+             # IRR of 14 is outside of the solver's bracket
+             [-100, 1500, 0, 0, 0, 0]]
+        rates = irr_batch(v)
+        assert_almost_equal(rates, [irr(cf) for cf in v])
+        assert_almost_equal(rates[6], 0.0886, 2)
+        assert_almost_equal(rates[7], 14.0)
+
+    def test_irr_batch_long(self):
+        # 30 year monthly series, NPV overflows at the bracket end without RuntimeWarnings
+        v = np.full((2, 361), 50.0)
+        v[:, 0] = -10000
+        v[1, :6] = -100
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')
+            rates = irr_batch(v)
+        assert_almost_equal(rates, [irr(cf) for cf in v])
+
+    def test_irr_no_root(self, caplog):
+        # NPV has no root, the solver steps onto r = -1 and reports that it doesn't converge
+        v = [-100, 0, 0, 0, 0, 0]
+        with caplog.at_level(logging.WARNING):
+            irr(v)
+            irr_batch([v])
+        assert caplog.text.count("IRR solver doesn't converge!") == 2
+
+    def test_irr_bracket_fallback(self, monkeypatch):
+        v = [[-150000, 15000, 25000, 35000, 45000, 60000],
+             [-100, 0, 0, 74],
+             [-100, 39, 59, 55, 20],
+             [-100, 100, 0, -7],
+             [-100, 100, 0, 7]]
+        expected = [irr(cf) for cf in v]
+        # without real positive polynomial roots irr scans BRACKET_RATES and solves by brentq
+        monkeypatch.setattr(irr_module.np, 'roots', lambda coeffs: irr_module.np.array([1j]))
+        for cf, rate in zip(v, expected):
+            assert_almost_equal(irr(cf), rate, 8)
+
+    def test_irr_root_on_bracket_rate(self, monkeypatch):
+        monkeypatch.setattr(irr_module.np, 'roots', lambda coeffs: irr_module.np.array([1j]))
+        def broyden1(*args, **kwargs):
+            raise AssertionError('broyden1 should not be reached')
+        monkeypatch.setattr(irr_module.opt, 'broyden1', broyden1)
+        # NPV(0) == 0 exactly, so no interval of BRACKET_RATES changes sign
+        assert irr([-100, 50, 50]) == 0.0
+        assert irr([-100, 250, -150]) == 0.0